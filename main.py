@@ -1,14 +1,21 @@
 #!/usr/bin/env python3
-import asyncio, json, os, random, textwrap, time
+import array, asyncio, contextlib, functools, heapq, itertools, json, math, os, pickle, random, sys, textwrap, time
+from collections import deque
+from dataclasses import dataclass
 from pathlib import Path
 import yaml
 from aiohttp import web
+try:
+    import orjson  # optional: faster save/load
+except ImportError:
+    orjson = None
 
 # ---------------- paths & data ----------------
 ROOT = Path(__file__).parent
 DATA = ROOT / "data"
 SAVES = ROOT / "saves"
 SAVES.mkdir(exist_ok=True)
+YAML_CACHE = DATA / ".cache"   # pickled parses, keyed by source mtime
 
 # ---------------- timing & combat pacing ----------------
 TICK_SECONDS = 1.0                 # global heartbeat tick
@@ -18,6 +25,10 @@ MOB_AI_PERIOD = 3                  # seconds between a mob's turns
 MOB_AI_JITTER = 1                  # +/- jitter added to period
 PLAYER_AUTO_SWING = 2.5            # seconds between auto-attacks from 'kill'
 PLAYER_MOVE_Cancels_AUTO = True
+REST_HEALS = 6                     # heals per 'rest'
+REST_TICKS_PER_HEAL = max(1, round(10 / TICK_SECONDS))  # one heal every ~10s of heartbeat
+SAVE_INTERVAL = 5                  # seconds between flushes of players marked dirty
+SLOW_CALLBACK_SECONDS = 0.05       # asyncio debug mode flags callbacks that stall the tick longer than this
 
 # ---- input normalization / direction aliases ----
 DIR_ALIASES = {
@@ -25,38 +36,66 @@ DIR_ALIASES = {
     'ne': 'northeast', 'nw': 'northwest', 'se': 'southeast', 'sw': 'southwest',
     'u': 'up', 'd': 'down'
 }
-FULL_DIRS = {'north','south','east','west','northeast','northwest','southeast','southwest','up','down'}
+FULL_DIRS = frozenset(('north','south','east','west','northeast','northwest','southeast','southwest','up','down'))
+
+# any direction word or alias -> full direction name
+_DIR_NORMALIZE = {**{d: d for d in FULL_DIRS}, **DIR_ALIASES}
 
 def normalize_cmd(line: str):
-    line = (line or '').strip()
-    parts = line.split()
+    parts = (line or '').split(None, 1)
     if not parts:
         return '', []
     verb = parts[0].lower()
-    args = parts[1:]
 
     # If user typed a bare direction -> convert to "go <dir>"
-    if verb in DIR_ALIASES:
-        return 'go', [DIR_ALIASES[verb]]
-    if verb in FULL_DIRS:
-        return 'go', [verb]
+    d = _DIR_NORMALIZE.get(verb)
+    if d is not None:
+        return 'go', [d]
+    args = parts[1].split() if len(parts) > 1 else []
 
     # If they typed "go se" or "go SE", normalize the arg
     if verb == 'go' and args:
-        d = args[0].lower()
-        if d in DIR_ALIASES:
-            args[0] = DIR_ALIASES[d]
-        elif d in FULL_DIRS:
-            args[0] = d
+        args[0] = _DIR_NORMALIZE.get(args[0].lower(), args[0])
     return verb, args
 
 # --------------- helpers ---------------
+_WRAPPER = textwrap.TextWrapper(width=90)  # textwrap.fill builds a new TextWrapper per call
+
 def wrap(s, width=90):
-    return "\n".join(textwrap.fill(line, width) for line in s.splitlines())
+    w = _WRAPPER if width == 90 else textwrap.TextWrapper(width=width)
+    return "\n".join([w.fill(line) for line in s.splitlines()])
+
+# bound once for the combat hot path; pct checks compare a uniform float instead of randint(1,100)
+_rand = random.random
+_randint = random.randint
+
+# pre-drawn ring for mob AI pacing jitter, cycled and never redrawn; purely cosmetic, so
+# anything players could exploit (loot, taunts, combat rolls) stays on _rand
+JITTER_RING = array.array('d', [random.uniform(-MOB_AI_JITTER, MOB_AI_JITTER) for _ in range(1024)])
+_next_jitter = itertools.cycle(JITTER_RING).__next__
 
 def clamp(x, lo, hi):
     return max(lo, min(hi, x))
 
+# cooldowns: key -> monotonic deadline, plus a (deadline, key) heap so expiry only touches what is due
+def start_cooldown(cds, heap, key, seconds, now):
+    due = now + seconds
+    cds[key] = due
+    heapq.heappush(heap, (due, key))
+
+def expire_cooldowns(cds, heap, now):
+    while heap and heap[0][0] <= now:
+        due, key = heapq.heappop(heap)
+        if cds.get(key) == due:  # otherwise re-armed since; a later entry covers it
+            del cds[key]
+
+def cooldown_left(cds, key, now):
+    """Whole seconds until key is ready again; 0 when it is."""
+    return max(0, math.ceil(cds.get(key, now) - now))
+
+# libyaml's C loader when available, pure-python otherwise
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 def load_yaml(name):
     p = DATA / name
     if not p.exists():
@@ -64,55 +103,140 @@ def load_yaml(name):
         return {}
     try:
         with open(p, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
+            data = yaml.load(f, Loader=_YAML_LOADER)
             return data or {}
     except Exception as e:
         print(f"[YAML ERROR] {name}: {e}")
         return {}
 
+def load_yaml_cached(name):
+    """load_yaml, but reuse a pickle of the last parse while the file's mtime is unchanged."""
+    p = DATA / name
+    try:
+        mtime = p.stat().st_mtime_ns
+    except OSError:
+        return load_yaml(name)
+    cached = YAML_CACHE / f"{name}.{mtime}.pkl"
+    if cached.exists():
+        try:
+            with open(cached, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"[YAML CACHE] {cached.name}: {e}")
+    data = load_yaml(name)
+    if data:
+        try:
+            YAML_CACHE.mkdir(exist_ok=True)
+            for stale in YAML_CACHE.glob(f"{name}.*.pkl"):
+                stale.unlink(missing_ok=True)
+            tmp = cached.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cached)
+        except Exception as e:
+            print(f"[YAML CACHE] could not write {cached.name}: {e}")
+    return data
+
+@functools.lru_cache(maxsize=4096)  # item names and typed queries repeat constantly
 def norm(s):  # case-insensitive key
     return (s or "").strip().lower()
 
 # Load data once at startup
-WORLD = load_yaml('world.yaml')
-RACES = load_yaml('races.yaml')
-CLASSES = load_yaml('classes.yaml')
-DEITIES = load_yaml('deities.yaml')
-NPCS = load_yaml('npcs.yaml')
-MONSTERS = load_yaml('monsters.yaml')
-QUESTS = load_yaml('quests.yaml')
-ITEMS = load_yaml('items.yaml')
-SHOPS = load_yaml('shops.yaml')
+WORLD = load_yaml_cached('world.yaml')
+RACES = load_yaml_cached('races.yaml')
+CLASSES = load_yaml_cached('classes.yaml')
+DEITIES = load_yaml_cached('deities.yaml')
+NPCS = load_yaml_cached('npcs.yaml')
+MONSTERS = load_yaml_cached('monsters.yaml')
+QUESTS = load_yaml_cached('quests.yaml')
+ITEMS = load_yaml_cached('items.yaml')
+SHOPS = load_yaml_cached('shops.yaml')
+
+def name_index(names):
+    """(exact, prefix) lookups: norm(name) -> name and each normalized prefix -> first name carrying it."""
+    exact, prefix = {}, {}
+    for n in names:
+        k = norm(n)
+        exact.setdefault(k, n)
+        for i in range(1, len(k)+1):
+            prefix.setdefault(k[:i], n)
+    return exact, prefix
+
+# sub-tables bound once; the data never changes at runtime
+ROOMS = WORLD.get('rooms') or {}
+MONSTER_TEMPLATES = MONSTERS.get('templates') or {}
+CLASS_ABILITIES = CLASSES.get('abilities') or {}
+CLASS_MODS = CLASSES.get('mods') or {}
+CLASS_BY_RACE = CLASSES.get('by_race') or {}
+CLASS_ARCHETYPES = CLASSES.get('archetype') or {}
+
+# lookup indexes built once from the static data
+ITEMS_BY_NORM, ITEMS_BY_PREFIX = name_index(ITEMS.keys())
+NPCS_BY_ROOM = {}    # room_id -> [npc,...]
+for _npc in NPCS.values():
+    NPCS_BY_ROOM.setdefault(_npc.get('room'), []).append(_npc)
+ROOM_TO_SHOP = {}    # room_id -> shop id (first shop listed for the room)
+for _sid, _s in (SHOPS.get('shops') or {}).items():
+    ROOM_TO_SHOP.setdefault(_s.get('room'), _sid)
+    _s['_norm_index'], _s['_prefix_index'] = name_index((_s.get('inventory') or {}).keys())
+
+# descriptions and dialogue never change at runtime, so wrap them once here
+for _r in ROOMS.values():
+    _r['_desc_wrapped'] = wrap(_r.get('desc', ''))
+_NPC_TEXT_DEFAULTS = {
+    'greet': 'They say nothing.',
+    'quest_start': 'Seek the truth near the Forgotten Acacia.',
+    'quest_turnin': 'You found it! We must be vigilant.',
+}
+for _npc in NPCS.values():
+    for _k, _default in _NPC_TEXT_DEFAULTS.items():
+        _npc[f'_{_k}_wrapped'] = wrap(_npc.get(_k, _default))
 
 # --------------- state ---------------
 PLAYERS = {}         # ws -> Player
-ROOM_INSTANCES = {}  # room_id -> {"mobs":[Mob], "dead_at":{Mob:ts}}
+PLAYERS_BY_ROOM = {} # room_id -> {Player: None} (insertion-ordered set of logged-in players)
+ROOM_INSTANCES = {}  # room_id -> {"mobs":[Mob], "alive_mobs":[Mob], "alive_mobs_by_lc":{prefix:[Mob]}}
 ROOM_GROUND = {}     # room_id -> [item_name,...] (loose loot on the ground)
+HEARTBEAT_TICKS = 0  # heartbeat ticks run so far; effect timing counts these
+EFFECT_HEAP = []     # (due_tick, seq, Entity, Effect); due_tick on the HEARTBEAT_TICKS count
+_effect_seq = itertools.count()  # heap tiebreaker so entities/effects are never compared
+# heartbeat work lists: only entities with something to do each tick are walked
+ACTIVE_PLAYERS = set()  # cooldowns ticking, auto-attacking or dead
+ACTIVE_MOBS = set()     # in combat, skills cooling down, or aggro with players present
+RESPAWN_HEAP = []       # (due_ts, id(Mob), Mob, room_id); dead mobs awaiting respawn
+ROOM_OUTBOX = {}     # room_id -> [(line, exclude_ws),...]; room lines not yet fanned out to occupants
 
 # --------------- models ---------------
+TICKING_EFFECTS = frozenset(('dot','hot'))  # kinds that fire on_tick; the rest only expire
+
 class Effect:
     """
     kind: 'dot' | 'hot' | 'buff' | (optionally others)
     For 'buff', use eff.mod to apply temporary deltas (e.g., {'power': +10})
+    Timing is absolute (next_tick_at/expires_at, in heartbeat ticks) and driven by EFFECT_HEAP.
     """
     def __init__(self, name, kind, amount=0, duration=0, tick=0, mod=None, source=None):
         self.name=name; self.kind=kind; self.amount=amount
-        self.duration=max(0, int(duration)); self.remaining=self.duration
-        self.tick = max(1, int(tick or 1)); self.next_tick_in=self.tick
+        self.duration=max(0, int(duration))
+        self.tick = max(1, int(tick or 1))
+        self.next_tick_at=0; self.expires_at=0
         self.mod = mod or {}; self.source=source
 
     def on_tick(self, target):
         msgs=[]
         if self.kind=='dot':
-            target.hp = clamp(target.hp - self.amount, 0, target.max_hp)
+            hp = target.hp - self.amount
+            target.hp = hp if hp > 0 else 0
             msgs.append(f"{target.name} suffers {self.amount} damage from {self.name}.")
             target.flag_combat()
         elif self.kind=='hot':
-            healed = clamp(self.amount, 0, target.max_hp - target.hp)
+            missing = target.max_hp - target.hp
+            healed = self.amount if self.amount < missing else missing
+            if healed < 0: healed = 0
             target.hp += healed
             msgs.append(f"{target.name} heals {healed} from {self.name}.")
         # buffs do not "tick"; they apply on add and are removed on expiry
-        self.next_tick_in = self.tick
+        self.next_tick_at += self.tick
         return msgs
 
 class Entity:
@@ -125,24 +249,39 @@ class Entity:
         self.last_combat_ts=0
 
     def flag_combat(self):
-        self.last_combat_ts = time.time()
+        self.last_combat_ts = time.monotonic()
+        self.wake()
+
+    def wake(self):
+        """Put the entity on the heartbeat's work list."""
 
     @property
     def in_combat(self):
+        return self.in_combat_at(time.monotonic())
+
+    def in_combat_at(self, now):
+        """in_combat against a clock reading the caller already has (one per heartbeat tick)."""
         if self.last_combat_ts==0: return False
-        return (time.time() - self.last_combat_ts) < OUT_OF_COMBAT_SECONDS
+        return (now - self.last_combat_ts) < OUT_OF_COMBAT_SECONDS
 
     def apply_damage(self, dmg):
         absorbed=0
         if self.shield>0:
             absorbed=min(self.shield, dmg)
             self.shield-=absorbed; dmg-=absorbed
-        self.hp = clamp(self.hp - max(0, dmg), 0, self.max_hp)
+        # damage only lowers hp, so only the floor needs checking
+        if dmg > 0:
+            hp = self.hp - dmg
+            self.hp = hp if hp > 0 else 0
         if self.hp<=0 and self.alive:
             self.alive=False
+            self.on_death()
         self.flag_combat()
         return absorbed
 
+    def on_death(self):
+        """Called once when apply_damage takes the entity from alive to dead."""
+
     def apply_mods(self, mods):
         """Apply temporary deltas to scalar attributes (e.g., power/defense/max_hp/shield)."""
         for k, v in (mods or {}).items():
@@ -159,17 +298,26 @@ class Entity:
     def add_effect(self, eff):
         self.effects.append(eff)
         # Apply buffs immediately (and any modded effect)
-        if eff.mod and eff.kind in ('buff',):
+        if eff.mod and eff.kind == 'buff':
             self.apply_mods(eff.mod)
+        # counted in ticks, not seconds, so an effect lands on the same ticks wherever
+        # in a tick it was added; even a 0-duration effect gets its one visit next tick
+        now = HEARTBEAT_TICKS
+        eff.expires_at = now + max(1, eff.duration)
+        # buffs never tick, so they only need a wake-up at expiry
+        eff.next_tick_at = now + eff.tick if eff.kind in TICKING_EFFECTS else eff.expires_at
+        heapq.heappush(EFFECT_HEAP, (min(eff.next_tick_at, eff.expires_at), next(_effect_seq), self, eff))
         self.flag_combat()
 
 class Player(Entity):
+    is_player = True  # cheaper than isinstance on the combat path
+
     def __init__(self, ws, ip):
         super().__init__(name="", room="trade_district")
         self.ws=ws; self.ip=ip
         self.race=None; self.cls=None; self.deity=None
         self.level=1; self.xp=0; self.obols=0
-        self.inventory=[]; self.cooldowns={}; self.flags={"created":False,"az_used":False}
+        self.inventory=[]; self.cooldowns={}; self._cd_heap=[]; self.flags={"created":False,"az_used":False}
         self.target=None; self.quest=None
         self.equipment={'weapon':None,'set':None,'shield':None}
         # primary stats
@@ -178,36 +326,73 @@ class Player(Entity):
         self.archetype='Warrior'  # default
         # runtime helpers
         self._dead_since=None
-        self._rest_task=None
-        self._auto_task=None  # auto-attack task from 'kill'
+        self._rest_ticks=0  # heartbeat ticks of rest left; 0 when not resting
+        self._next_swing_at=None  # monotonic time of the next 'kill' auto-attack; None when not auto-attacking
+        self._dirty=False     # unsaved progress; flushed by the saver task
+        self._stats_key=None  # inputs of the last recompute_stats
+        self._rb={}; self._cb={}  # race/class mod tables
+        # outbound text; drained by a single writer task per connection
+        self.out_queue=deque()
+        self._out_ready=asyncio.Event()
+        self._writer_task=None
+
+    def wake(self):
+        ACTIVE_PLAYERS.add(self)
+
+    def idle(self):
+        return self.alive and not self.cooldowns and self._next_swing_at is None and not self._rest_ticks
+
+    def queue(self, msg):
+        # room lines said before this one must reach us first
+        if self.room in ROOM_OUTBOX:
+            flush_room(self.room)
+        self._push(msg)
+
+    def _push(self, msg):
+        self.out_queue.append(msg)
+        self._out_ready.set()
 
     def to_json(self):
         return {
             'name': self.name, 'race': self.race, 'cls': self.cls, 'deity': self.deity,
             'room': self.room, 'hp': self.hp, 'max_hp': self.max_hp, 'power': self.power,
             'defense': self.defense, 'shield': self.shield, 'level': self.level, 'xp': self.xp,
-            'inventory': self.inventory, 'cooldowns': self.cooldowns, 'flags': self.flags,
+            'inventory': self.inventory, 'cooldowns': self.cooldowns_left(), 'flags': self.flags,
             'quest': self.quest, 'equipment': self.equipment, 'stats': self.stats,
             'obols': self.obols, 'archetype': self.archetype
         }
 
+    def cooldowns_left(self):
+        now = time.monotonic()
+        return {k: cooldown_left(self.cooldowns, k, now) for k in self.cooldowns}
+
     @property
     def save_path(self):
         return SAVES / f"{(self.name or 'player').lower()}.json"
 
     # recompute derived stats from base + gear
     def recompute_stats(self):
+        eq = self.equipment
+        key = (self.race, self.cls, self.archetype, tuple(self.stats.values()),
+               eq.get('weapon'), eq.get('set'), eq.get('shield'))
+        if key == self._stats_key:
+            return
+        if self._stats_key is None or key[:2] != self._stats_key[:2]:
+            self._rb = RACES.get(self.race,{}).get('mod',{})
+            self._cb = CLASS_MODS.get(self.cls,{})
+        self._stats_key = key
+
         base_hp = 100
         base_def = 0
         base_pow = 10
 
         # class/race mods
-        rb = RACES.get(self.race,{}).get('mod',{})
-        cb = (CLASSES.get('mods',{}) or {}).get(self.cls,{})
+        rb = self._rb
+        cb = self._cb
         # gear mods
-        wmod = get_item_mods(self.equipment.get('weapon'))
-        setmod = get_item_mods(self.equipment.get('set'))
-        shmod = get_item_mods(self.equipment.get('shield'))
+        wmod = get_item_mods(eq.get('weapon'))
+        setmod = get_item_mods(eq.get('set'))
+        shmod = get_item_mods(eq.get('shield'))
 
         # primary stat to power scaling by archetype
         arch = self.archetype
@@ -234,15 +419,17 @@ class Player(Entity):
         self.power = max(1, scaled_power + pow_bonus)
         self.defense = max(0, scaled_def + def_bonus)
         self.max_hp = max(1, base_hp + rb.get('hp',0) + cb.get('hp',0) + hp_bonus)
-        self.hp = clamp(self.hp, 0, self.max_hp)
+        if self.hp > self.max_hp: self.hp = self.max_hp
 
 class Mob(Entity):
+    is_player = False
+
     def __init__(self, template_id, room_id):
-        if not MONSTERS or not MONSTERS.get('templates'):
+        if not MONSTER_TEMPLATES:
             raise ValueError(f"MONSTERS['templates'] not initialized, can't spawn {template_id}")
-        if template_id not in MONSTERS['templates']:
+        if template_id not in MONSTER_TEMPLATES:
             raise ValueError(f"Template '{template_id}' not found in monsters.yaml")
-        t = MONSTERS['templates'][template_id]
+        t = MONSTER_TEMPLATES[template_id]
         super().__init__(name=t['name'], room=room_id)
         self.template_id=template_id
         self.max_hp=t.get('hp',60); self.hp=self.max_hp
@@ -250,23 +437,96 @@ class Mob(Entity):
         self.aggro=t.get('aggro',False); self.loot=t.get('loot',[])
         self.respawn=t.get('respawn',45)
         self.skills=t.get('skills',[])  # [{name,type,amount|per_tick,duration,cd}]
-        self._skill_cd = {}  # name->seconds
-        # AI pacing
-        self._ai_cd = random.randint(0, MOB_AI_PERIOD)  # desync mob turns a bit
+        self._skill_cd = {}  # name->monotonic deadline
+        self._cd_heap = []
+        # AI pacing (monotonic deadline of the next turn)
+        self._next_ai_at = time.monotonic() + random.randint(0, MOB_AI_PERIOD)  # desync mob turns a bit
+
+    def wake(self):
+        if self.alive:
+            ACTIVE_MOBS.add(self)
+
+    def idle(self, now):
+        return not self._skill_cd and not self.in_combat_at(now) and not (self.aggro and PLAYERS_BY_ROOM.get(self.room))
+
+    def on_death(self):
+        ACTIVE_MOBS.discard(self)
+        heapq.heappush(RESPAWN_HEAP, (time.monotonic() + self.respawn, id(self), self, self.room))
+        inst = ROOM_INSTANCES.get(self.room)
+        if not inst:
+            return
+        if self in inst['alive_mobs']:
+            inst['alive_mobs'].remove(self)
+        by_lc = inst['alive_mobs_by_lc']
+        lc = self.name.lower()
+        for i in range(1, len(lc)+1):
+            same = by_lc.get(lc[:i])
+            if same and self in same:
+                same.remove(self)
 
 # --------------- persistence helpers ---------------
+# a single writer task keeps successive writes of the same save file in order
+SAVE_QUEUE = None  # (path, encoded bytes) items; exists while _save_writer runs
+
+def _encode_save(data):
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode("utf-8")
+
+def _write_save(path, data):
+    try:
+        with open(path, "wb") as f:
+            f.write(data)
+    except Exception as e:
+        print("Save error:", e)
+
+def _write_saves(batch):
+    for path, data in batch.items():
+        _write_save(path, data)
+
 def save_player(p: Player):
+    # serialize on the loop (a consistent snapshot), write the file off it
+    p._dirty = False
     try:
-        with open(p.save_path, "w", encoding="utf-8") as f:
-            json.dump(p.to_json(), f, indent=2)
+        data = _encode_save(p.to_json())
     except Exception as e:
         print("Save error:", e)
+        return
+    if SAVE_QUEUE is None:
+        _write_save(p.save_path, data)
+        return
+    SAVE_QUEUE.put_nowait((p.save_path, data))
+
+async def _save_writer():
+    """Write queued saves on a worker thread, newest snapshot per file, until a None arrives."""
+    global SAVE_QUEUE
+    SAVE_QUEUE = asyncio.Queue()
+    try:
+        stop = False
+        while not stop:
+            batch = {}
+            item = await SAVE_QUEUE.get()
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                path, data = item
+                batch[path] = data
+                if SAVE_QUEUE.empty():
+                    break
+                item = SAVE_QUEUE.get_nowait()
+            if batch:
+                await asyncio.to_thread(_write_saves, batch)
+    finally:
+        SAVE_QUEUE = None
 
 def load_player(name: str):
     path = SAVES / f"{name.lower()}.json"
     if not path.exists():
         return None
     try:
+        if orjson is not None:
+            return orjson.loads(path.read_bytes())
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception as e:
@@ -274,59 +534,195 @@ def load_player(name: str):
         return None
 
 # --------------- items helpers ---------------
+@dataclass(slots=True, frozen=True)
+class ItemDef:
+    """An items.yaml entry with defaults applied and its examine stats line prebuilt."""
+    type: str
+    value: int
+    mods: dict
+    desc: str
+    stats_line: str  # "Stats: power+2, ..." or "" when the item has no mods
+
+def _item_def_from(d):
+    mods = d.get('mods') or {}
+    return ItemDef(
+        type=d.get('type','item'),
+        value=int(d.get('value', d.get('vendor_value', 0))),
+        mods=mods,
+        desc=d.get('desc') or '',
+        stats_line=("Stats: " + ", ".join(f"{k}+{v}" for k,v in mods.items())) if mods else '',
+    )
+
+ITEM_DEFS = {name: _item_def_from(d) for name, d in ITEMS.items() if d}
+
 def get_item_def(item_name):
-    if not item_name: return {}
-    # try direct, then case-insensitive scan
-    d = ITEMS.get(item_name) or ITEMS.get(item_name.strip())
+    if not item_name: return None
+    # try direct, then case-insensitive lookup
+    d = ITEM_DEFS.get(item_name)
     if d: return d
-    q = norm(item_name)
-    for k, v in ITEMS.items():
-        if norm(k) == q:
-            return v
-    return {}
+    k = ITEMS_BY_NORM.get(norm(item_name))
+    return ITEM_DEFS.get(k) if k else None
 
+@functools.lru_cache(maxsize=256)
 def get_item_mods(item_name):
     d=get_item_def(item_name)
-    return d.get('mods',{})
+    return d.mods if d else {}
 
 def match_item_name(query):
     if not query: return None
     q=norm(query)
-    names=list(ITEMS.keys())
-    for n in names:
-        if norm(n)==q: return n
+    return ITEMS_BY_NORM.get(q) or ITEMS_BY_PREFIX.get(q)
+
+def match_carried(names, want):
+    """First of names (inventory, ground) whose normalized form starts with norm(want)."""
+    nw=norm(want)
     for n in names:
-        if norm(n).startswith(q): return n
+        if norm(n).startswith(nw):
+            return n
     return None
 
 # --------------- io helpers ---------------
 async def send(ws, msg):
+    p = PLAYERS.get(ws)
+    if p is not None:
+        p.queue(msg)
+        return
     try:
         await ws.send_str(msg)
     except Exception:
         pass
 
 def say_room(room_id, msg, exclude=None):
-    for pl in PLAYERS.values():
-        if pl.room==room_id and pl.ws is not exclude:
-            asyncio.create_task(send(pl.ws, msg))
+    # buffered per room; occupants get everything said since the last flush as one string
+    if PLAYERS_BY_ROOM.get(room_id):
+        ROOM_OUTBOX.setdefault(room_id, []).append((msg, exclude))
+
+def flush_room(room_id):
+    lines = ROOM_OUTBOX.pop(room_id, None)
+    if not lines:
+        return
+    here = PLAYERS_BY_ROOM.get(room_id, ())
+    if all(ex is None for _, ex in lines):
+        buf = "".join([msg for msg, _ in lines])
+        for pl in here:
+            pl._push(buf)
+        return
+    for pl in here:
+        buf = "".join([msg for msg, ex in lines if ex is not pl.ws])
+        if buf:
+            pl._push(buf)
+
+def flush_outboxes():
+    """Fan out every room's pending lines; run at the end of each tick and command."""
+    while ROOM_OUTBOX:
+        flush_room(next(iter(ROOM_OUTBOX)))
+
+async def _writer_loop(p: Player):
+    # everything queued since the last wake-up goes out as one frame
+    q = p.out_queue
+    try:
+        while True:
+            await p._out_ready.wait()
+            p._out_ready.clear()
+            if not q:
+                continue
+            buf = "".join(q)
+            q.clear()
+            try:
+                await p.ws.send_str(buf)
+            except Exception:
+                pass
+    except asyncio.CancelledError:
+        return
+
+async def _cancel_task(task):
+    """Cancel task if it is still running and wait for it to unwind."""
+    if task and not task.done():
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+def start_writer(p: Player):
+    p._writer_task = asyncio.create_task(_writer_loop(p))
+
+async def stop_writer(p: Player):
+    """Stop the writer task and push out anything still queued."""
+    task = p._writer_task
+    p._writer_task = None
+    await _cancel_task(task)
+    flush_room(p.room)
+    if p.out_queue and not p.ws.closed:
+        buf = "".join(p.out_queue)
+        p.out_queue.clear()
+        try:
+            await p.ws.send_str(buf)
+        except Exception:
+            pass
 
 # --------------- world helpers ---------------
 def room(rid):
-    return (WORLD.get('rooms') or {}).get(rid)
+    return ROOMS.get(rid)
 
 def room_ground(rid):
     return ROOM_GROUND.setdefault(rid, [])
 
-async def show_room(p: Player):
+def place_player(p: Player, rid):
+    """Move p into rid, keeping PLAYERS_BY_ROOM in sync."""
+    # lines said before the move go to whoever was in each room at the time
+    flush_room(p.room); flush_room(rid)
+    here = PLAYERS_BY_ROOM.get(p.room)
+    if here is not None:
+        here.pop(p, None)
+    p.room = rid
+    PLAYERS_BY_ROOM.setdefault(rid, {})[p] = None
+    # aggressive mobs only need AI turns while someone is there to attack
+    for m in room_instance(rid)['alive_mobs']:
+        if m.aggro:
+            ACTIVE_MOBS.add(m)
+
+def unplace_player(p: Player):
+    flush_room(p.room)
+    here = PLAYERS_BY_ROOM.get(p.room)
+    if here is not None:
+        here.pop(p, None)
+
+def new_room_instance():
+    return {"mobs": [], "alive_mobs": [], "alive_mobs_by_lc": {}}
+
+# shared by room ids that are not in ROOMS; never mutated
+_EMPTY_INSTANCE = new_room_instance()
+
+def room_instance(rid):
+    return ROOM_INSTANCES.get(rid) or _EMPTY_INSTANCE
+
+def index_room_mobs(inst):
+    # living mobs, plus lowercased name prefix -> living mobs carrying it (spawn order);
+    # rebuilt whenever the roster changes, pruned by Mob.on_death in between
+    alive = [m for m in inst['mobs'] if m.alive]
+    by_lc = {}
+    for m in alive:
+        lc = m.name.lower()
+        for i in range(1, len(lc)+1):
+            by_lc.setdefault(lc[:i], []).append(m)
+    inst['alive_mobs'] = alive
+    inst['alive_mobs_by_lc'] = by_lc
+
+def find_mob(rid, query):
+    """First living mob in rid whose name starts with query (case-insensitive)."""
+    if not query:
+        return None
+    same = room_instance(rid)['alive_mobs_by_lc'].get(query.lower())
+    return same[0] if same else None
+
+def show_room(p: Player):
     r = room(p.room)
     if not r:
-        await send(p.ws, "This place does not exist.\n"); return
+        p.queue("This place does not exist.\n"); return
     title=r['name']; exits=r.get('exits',{})
-    players=[q.name for q in PLAYERS.values() if q.room==p.room and q is not p and q.name]
-    mobs=[m.name for m in ROOM_INSTANCES.get(p.room,{}).get('mobs',[]) if m.alive]
+    players=[q.name for q in PLAYERS_BY_ROOM.get(p.room, ()) if q is not p and q.name]
+    mobs=[m.name for m in room_instance(p.room)['alive_mobs']]
     ground=room_ground(p.room)
-    out=f"\n{title}\n{'-'*len(title)}\n{wrap(r['desc'])}\n"
+    out=f"\n{title}\n{'-'*len(title)}\n{r['_desc_wrapped']}\n"
     # soft nav hints from world "nav" field (optional)
     nav=r.get('nav',{})
     if nav:
@@ -343,7 +739,7 @@ async def show_room(p: Player):
         out+=f"On the ground: {', '.join(ground)}\n"
     if exits:
         out+="Exits: "+", ".join(exits.keys())+"\n"
-    await send(p.ws, out)
+    p.queue(out)
 
 # --------------- creation (with stats) ---------------
 def roll_stats_for_archetype(arch):
@@ -360,8 +756,24 @@ def roll_stats_for_archetype(arch):
     return base
 
 def archetype_for_class(cls_name):
-    arch_map = CLASSES.get('archetype',{}) or {}
-    return arch_map.get(cls_name,'Warrior')
+    return CLASS_ARCHETYPES.get(cls_name,'Warrior')
+
+def class_options_for(race):
+    return CLASS_BY_RACE.get(race) or ["Warrior","Mage","Healer","Rogue"]
+
+def deity_options():
+    return list((DEITIES or {}).keys()) or ['None']
+
+def _creation_menu():
+    lines = ["", "Choose your race, class and deity in one reply, e.g. \"2 1 3\".", "Race (class choices):"]
+    for i, race in enumerate(RACES.keys()):
+        classes = " ".join(f"{j+1}) {c}" for j, c in enumerate(class_options_for(race)))
+        lines.append(f"  {i+1}) {race} — {classes}")
+    lines.append("Deity:")
+    lines.extend(f"  {i+1}) {d}" for i, d in enumerate(deity_options()))
+    return "\n".join(lines) + "\n> "
+
+CREATION_MENU = _creation_menu()
 
 def _safe_index(sel, choices):
     try:
@@ -387,34 +799,26 @@ async def create_character(p: Player):
                 setattr(p, k, existing[k])
         p.recompute_stats()
         await send(p.ws, f"\nWelcome back, {p.name}! Resuming your journey.\n")
-        await show_room(p)
+        show_room(p)
         return True
 
-    # New character flow
+    # New character flow: race, class and deity are picked in a single reply
+    await send(p.ws, CREATION_MENU)
+    sel = await p.ws.receive()
+    if sel.type != web.WSMsgType.TEXT:
+        return False
+    picks = sel.data.split()
+
+    def pick(i):  # missing picks default to 1
+        return picks[i] if i < len(picks) else None
+
     race_keys=list(RACES.keys())
-    await send(p.ws, "\nChoose your race:\n"+"\n".join(f"  {i+1}) {k}" for i,k in enumerate(race_keys))+"\n> ")
-    rsel = await p.ws.receive()
-    idx  = _safe_index(getattr(rsel, 'data', '1'), race_keys)
-    p.race = race_keys[idx]
-
-    # Class by race
-    cls_opts = (CLASSES.get('by_race',{}) or {}).get(p.race, [])
-    if not cls_opts:
-        cls_opts = ["Warrior","Mage","Healer","Rogue"]
-    await send(p.ws, f"\nChoose your class ({p.race}):\n"+"\n".join(f"  {i+1}) {k}" for i,k in enumerate(cls_opts))+"\n> ")
-    csel = await p.ws.receive()
-    cidx = _safe_index(getattr(csel, 'data', '1'), cls_opts)
-    p.cls = cls_opts[cidx]
+    p.race = race_keys[_safe_index(pick(0), race_keys)]
+    cls_opts = class_options_for(p.race)
+    p.cls = cls_opts[_safe_index(pick(1), cls_opts)]
     p.archetype = archetype_for_class(p.cls)
-
-    # Deity
-    deities=list((DEITIES or {}).keys())
-    if not deities:
-        deities=['None']
-    await send(p.ws, "\nChoose your deity:\n"+"\n".join(f"  {i+1}) {k}" for i,k in enumerate(deities))+"\n> ")
-    dsel = await p.ws.receive()
-    didx = _safe_index(getattr(dsel, 'data', '1'), deities)
-    p.deity = deities[didx]
+    deities = deity_options()
+    p.deity = deities[_safe_index(pick(2), deities)]
 
     # Stats: roll & set HP baseline then gear calc
     p.stats = roll_stats_for_archetype(p.archetype)
@@ -427,28 +831,124 @@ async def create_character(p: Player):
     p.quest={'id':'intro_cult_talisman','stage':0}
 
     await send(p.ws, f"\nWelcome, {p.name} the {p.race} {p.cls}, devotee of {p.deity}.\n")
-    await show_room(p)
+    show_room(p)
     return True
 
 # --------------- abilities & combat ---------------
-def ability_defs_for(p: Player):
-    acts = (CLASSES.get('abilities',{}) or {}).get(p.cls, [])[:]
-    deity = (DEITIES or {}).get(p.deity, {})
+# hottest broadcast lines; each is built once per event and the same str is queued to every recipient
+MSG_HIT = "* %s hits %s for %d (%d absorbed).\n"
+MSG_SKILL_HIT = "* %s uses %s on %s for %d (%d absorbed).\n"
+MSG_DIES = "* %s dies.\n"
+MSG_FALLS = "* %s falls!\n"
+
+@functools.lru_cache(maxsize=None)
+def _ability_list(cls, deity_name):
+    acts = list(CLASS_ABILITIES.get(cls, []))
+    deity = (DEITIES or {}).get(deity_name, {})
     deity_act = deity.get('active') if isinstance(deity, dict) else None
     if deity_act:
         acts.append(deity_act)
-    return acts
+    return tuple(acts)
+
+def ability_defs_for(p: Player):
+    return _ability_list(p.cls, p.deity)
 
 def try_dodge_block(p: Player):
     # DEX gives dodge chance; DEF stat gives small block
     dodge_chance = min(40, 5 + p.stats['DEX'] // 3)  # %
-    if random.randint(1,100) <= dodge_chance:
+    if _rand() < dodge_chance * 0.01:
         return "dodge"
     block_chance = min(25, p.stats['DEF'] // 3)
-    if random.randint(1,100) <= block_chance:
+    if _rand() < block_chance * 0.01:
         return "block"
     return None
 
+# ---- compiled ability handlers ----
+# handler(p, target, out) -> one of these; out collects the caster's broadcast text
+ABIL_LANDED, ABIL_AVOIDED, ABIL_KILLED = 0, 1, 2
+
+# archetype -> ability damage scaling from primary stats (anything else scales off STR)
+_ABILITY_SCALE = {
+    'Mage': lambda p: p.stats['INT']//4,
+    'Rogue': lambda p: p.stats['DEX']//4,
+    'Healer': lambda p: p.stats['INT']//5,
+}
+def _str_scale(p): return p.stats['STR']//4
+
+def compile_ability(abil, archetype):
+    """Specialize one ability definition into a handler with its numbers and text baked in."""
+    name = abil.get('name', 'Ability'); typ = abil.get('type')
+    if typ=='damage':
+        bonus = abil.get('flat',0) + abil.get('amount',0)
+        scale = _ABILITY_SCALE.get(archetype, _str_scale)
+        def handler(p, target, out):
+            # check target dodge
+            if target.is_player:
+                res = try_dodge_block(target)
+                if res == "dodge":
+                    say_room(p.room, f"* {p.name}'s {name} misses {target.name} (dodged).\n")
+                    return ABIL_AVOIDED
+                if res == "block":
+                    say_room(p.room, f"* {target.name} blocks {p.name}'s {name}.\n")
+                    return ABIL_AVOIDED
+            dmg = p.power + bonus + scale(p) - getattr(target,'defense',0)
+            if dmg < 0: dmg = 0
+            absorbed=target.apply_damage(dmg)
+            out.append(f"You use {name} on {target.name} for {dmg} ({absorbed} absorbed).")
+            if not target.alive and not target.is_player:
+                return ABIL_KILLED
+            return ABIL_LANDED
+    elif typ in TICKING_EFFECTS:
+        amount=abil.get('per_tick',5); dur=abil.get('duration',10); tick=abil.get('tick',1)
+        verb = "afflict" if typ=='dot' else "bless"
+        def handler(p, target, out):
+            target.add_effect(Effect(name,typ,amount=amount,duration=dur,tick=tick))
+            out.append(f"You {verb} {target.name} with {name}.")
+            return ABIL_LANDED
+    elif typ=='buff':
+        dur=abil.get('duration',10)
+        mod = dict(abil.get('mod') or {}) or {'power': abil.get('amount',5)}
+        mod_str = ", ".join(f"{k}+{v}" for k,v in mod.items())
+        line = f"You empower yourself with {name} ({mod_str}) for {dur}s."
+        def handler(p, target, out):
+            p.add_effect(Effect(name,'buff',duration=dur,mod=dict(mod)))
+            out.append(line)
+            return ABIL_LANDED
+    elif typ=='shield':
+        val=abil.get('amount',50)
+        def handler(p, target, out):
+            target.shield+=val; out.append(f"A shield of {val} surrounds {target.name}.")
+            return ABIL_LANDED
+    elif typ=='heal':
+        base=abil.get('amount',30)
+        def handler(p, target, out):
+            heal=base + (p.stats['INT']//3)
+            healed=clamp(heal,0,target.max_hp-target.hp); target.hp+=healed
+            out.append(f"You heal {target.name} for {healed} HP.")
+            return ABIL_LANDED
+    elif typ=='lifesteal':
+        base=abil.get('amount',20)
+        def handler(p, target, out):
+            dmg=base + (p.stats['INT']//4)
+            absorbed=target.apply_damage(dmg); leeched=max(0,dmg-absorbed)
+            p.hp = clamp(p.hp+leeched, 0, p.max_hp)
+            out.append(f"You drain {leeched} life from {target.name} with {name}.")
+            return ABIL_LANDED
+    else:
+        def handler(p, target, out):
+            return ABIL_LANDED
+    return handler
+
+@functools.lru_cache(maxsize=None)
+def _compiled_abilities(cls, deity_name, archetype):
+    # lowercased id and name -> (ability, handler); the first definition wins, like the old linear scan
+    idx = {}
+    for a in _ability_list(cls, deity_name):
+        entry = (a, compile_ability(a, archetype))
+        idx.setdefault(a.get('id','').lower(), entry)
+        idx.setdefault(a.get('name','').lower(), entry)
+    return idx
+
 async def cmd_use(p: Player, args):
     if not args:
         await send(p.ws, "Use what?\n"); return
@@ -456,146 +956,87 @@ async def cmd_use(p: Player, args):
     lname=name.lower()
 
     # find ability by id or name, case-insensitive
-    abil=None
-    for a in ability_defs_for(p):
-        if a.get('id','').lower()==lname or a.get('name','').lower()==lname:
-            abil=a; break
-    if not abil:
+    entry=_compiled_abilities(p.cls, p.deity, p.archetype).get(lname)
+    if not entry:
         await send(p.ws, "Unknown ability.\n"); return
+    abil, handler = entry
 
-    if abil.get('id') in p.cooldowns:
-        await send(p.ws, f"{abil.get('name','Ability')} on cooldown {p.cooldowns[abil['id']]}s.\n"); return
+    now = time.monotonic()
+    left = cooldown_left(p.cooldowns, abil.get('id'), now)
+    if left:
+        await send(p.ws, f"{abil.get('name','Ability')} on cooldown {left}s.\n"); return
 
     # target
     target=None
     if target_name:
         tnorm=str(target_name).lower()
-        for m in ROOM_INSTANCES.get(p.room,{}).get('mobs',[]):
-            if m.alive and m.name.lower().startswith(tnorm):
-                target=m; break
+        target=find_mob(p.room, tnorm)
         if not target:
-            for q in PLAYERS.values():
-                if q.room==p.room and q.name and q.name.lower().startswith(tnorm):
+            for q in PLAYERS_BY_ROOM.get(p.room, ()):
+                if q.name and q.name.lower().startswith(tnorm):
                     target=q; break
     if abil.get('target','enemy')=='self':
         target=p
     if not target:
         await send(p.ws, "No valid target.\n"); return
 
-    out=[]; typ=abil.get('type')
-    # scale damage by archetype/stat
-    scale = 0
-    if p.archetype=='Mage':
-        scale = p.stats['INT']//4
-    elif p.archetype=='Rogue':
-        scale = p.stats['DEX']//4
-    elif p.archetype=='Healer':
-        scale = p.stats['INT']//5
-    else:
-        scale = p.stats['STR']//4
-
-    power = p.power + abil.get('flat',0) + scale
-    if typ=='damage':
-        # check target dodge
-        if isinstance(target, Player):
-            res = try_dodge_block(target)
-            if res == "dodge":
-                say_room(p.room, f"* {p.name}'s {abil['name']} misses {target.name} (dodged).\n")
-                return
-            if res == "block":
-                say_room(p.room, f"* {target.name} blocks {p.name}'s {abil['name']}.\n")
-                return
-        dmg=max(0, power + abil.get('amount',0) - getattr(target,'defense',0))
-        absorbed=target.apply_damage(dmg)
-        out.append(f"You use {abil['name']} on {target.name} for {dmg} ({absorbed} absorbed).")
-        if not target.alive and isinstance(target, Mob):
-            await mob_death(target, p)
-    elif typ=='dot':
-        e=Effect(abil['name'],'dot',amount=abil.get('per_tick',5),duration=abil.get('duration',10),tick=abil.get('tick',1))
-        target.add_effect(e); out.append(f"You afflict {target.name} with {abil['name']}.")
-    elif typ=='hot':
-        e=Effect(abil['name'],'hot',amount=abil.get('per_tick',5),duration=abil.get('duration',10),tick=abil.get('tick',1))
-        target.add_effect(e); out.append(f"You bless {target.name} with {abil['name']}.")
-    elif typ=='buff':
-        amt=abil.get('amount',5); dur=abil.get('duration',10)
-        mod = dict(abil.get('mod') or {})
-        if not mod:
-            mod = {'power': amt}
-        e=Effect(abil['name'],'buff',duration=dur,mod=mod); p.add_effect(e)
-        mod_str = ", ".join(f"{k}+{v}" for k,v in mod.items())
-        out.append(f"You empower yourself with {abil['name']} ({mod_str}) for {dur}s.")
-    elif typ=='shield':
-        val=abil.get('amount',50); target.shield+=val; out.append(f"A shield of {val} surrounds {target.name}.")
-    elif typ=='heal':
-        heal=abil.get('amount',30) + (p.stats['INT']//3)
-        healed=clamp(heal,0,target.max_hp-target.hp); target.hp+=healed
-        out.append(f"You heal {target.name} for {healed} HP.")
-    elif typ=='lifesteal':
-        dmg=abil.get('amount',20) + (p.stats['INT']//4)
-        absorbed=target.apply_damage(dmg); leeched=max(0,dmg-absorbed)
-        p.hp = clamp(p.hp+leeched, 0, p.max_hp)
-        out.append(f"You drain {leeched} life from {target.name} with {abil['name']}.")
+    out=[]
+    res = handler(p, target, out)
+    if res == ABIL_AVOIDED:
+        return
+    if res == ABIL_KILLED:
+        mob_death(target, p)
 
-    if abil.get('cd'): p.cooldowns[abil['id']]=int(abil['cd'])
+    if abil.get('cd'): start_cooldown(p.cooldowns, p._cd_heap, abil['id'], int(abil['cd']), now); p.wake()
     say_room(p.room, '* ' + " ".join(out) + "\n")
 
 async def cmd_attack(p: Player, args):
     if not args:
         await send(p.ws, "Attack what?\n"); return
-    name=args[0].lower()
-    for m in ROOM_INSTANCES.get(p.room,{}).get('mobs',[]):
-        if m.alive and m.name.lower().startswith(name):
-            p.target=m.name
-            dmg=max(0, (p.power + p.stats['STR']//5) - m.defense)
-            absorbed=m.apply_damage(dmg)
-            say_room(p.room, f"* {p.name} hits {m.name} for {dmg} ({absorbed} absorbed).\n")
-            if not m.alive:
-                await mob_death(m, p)
-            return
-    await send(p.ws, "No such mob here.\n")
+    m=find_mob(p.room, args[0])
+    if not m:
+        await send(p.ws, "No such mob here.\n"); return
+    p.target=m.name
+    dmg=max(0, (p.power + p.stats['STR']//5) - m.defense)
+    absorbed=m.apply_damage(dmg)
+    say_room(p.room, MSG_HIT % (p.name, m.name, dmg, absorbed))
+    if not m.alive:
+        mob_death(m, p)
 
 # ----------- AUTO-ATTACK ('kill') -----------
 def _pick_best_target_for_kill(p: Player):
-    inst = ROOM_INSTANCES.get(p.room, {})
-    mobs = [m for m in inst.get('mobs',[]) if m.alive]
+    mobs = room_instance(p.room)['alive_mobs']
     if not mobs:
         return None
     # Prefer aggressive mobs first, else any
     aggro = [m for m in mobs if m.aggro]
     return (aggro or mobs)[0]
 
-async def _auto_attack_loop(p: Player):
-    try:
-        while True:
-            await asyncio.sleep(PLAYER_AUTO_SWING)
-            if not p.alive: break
-            # verify target still valid/alive/in room
-            inst = ROOM_INSTANCES.get(p.room, {})
-            target = None
-            for m in inst.get('mobs', []):
-                if m.alive and p.target and m.name.lower().startswith(p.target.lower()):
-                    target = m; break
-            if not target:
-                await send(p.ws, "Your target is gone.\n"); break
-            # swing
-            dmg = max(0, (p.power + p.stats['STR']//5) - target.defense)
-            absorbed = target.apply_damage(dmg)
-            say_room(p.room, f"* {p.name} hits {target.name} for {dmg} ({absorbed} absorbed).\n")
-            if not target.alive:
-                await mob_death(target, p)
-                break
-    except asyncio.CancelledError:
+def _auto_swing(p: Player):
+    """One 'kill' auto-attack swing; the heartbeat calls this once p._next_swing_at is due."""
+    if not p.alive:
+        p._next_swing_at = None; return
+    # verify target still valid/alive/in room
+    target = find_mob(p.room, p.target)
+    if not target:
+        p._next_swing_at = None
+        p.queue("Your target is gone.\n"); return
+    # swing
+    dmg = p.power + p.stats['STR']//5 - target.defense
+    if dmg < 0: dmg = 0
+    absorbed = target.apply_damage(dmg)
+    say_room(p.room, MSG_HIT % (p.name, target.name, dmg, absorbed))
+    if not target.alive:
+        p._next_swing_at = None
+        mob_death(target, p)
         return
+    p._next_swing_at += PLAYER_AUTO_SWING
 
 async def cmd_kill(p: Player, args):
     # choose target if none provided
     target_name = " ".join(args) if args else None
-    target_obj = None
-    inst = ROOM_INSTANCES.get(p.room, {})
     if target_name:
-        for m in inst.get('mobs', []):
-            if m.alive and m.name.lower().startswith(target_name.lower()):
-                target_obj = m; break
+        target_obj = find_mob(p.room, target_name)
     else:
         target_obj = _pick_best_target_for_kill(p)
     if not target_obj:
@@ -606,23 +1047,18 @@ async def cmd_kill(p: Player, args):
     # one immediate swing to start combat
     dmg=max(0, (p.power + p.stats['STR']//5) - target_obj.defense)
     absorbed=target_obj.apply_damage(dmg)
-    say_room(p.room, f"* {p.name} hits {target_obj.name} for {dmg} ({absorbed} absorbed).\n")
+    say_room(p.room, MSG_HIT % (p.name, target_obj.name, dmg, absorbed))
     if not target_obj.alive:
-        await mob_death(target_obj, p)
+        mob_death(target_obj, p)
         return
 
-    # start/restart auto-loop
-    if p._auto_task and not p._auto_task.done():
-        p._auto_task.cancel()
-        try:
-            await p._auto_task
-        except asyncio.CancelledError:
-            pass
-    p._auto_task = asyncio.create_task(_auto_attack_loop(p))
+    # start/restart auto-attack; the heartbeat swings when it is due
+    p._next_swing_at = time.monotonic() + PLAYER_AUTO_SWING
+    p.wake()
 
 # --------------- NPCs / Quests ---------------
 def npcs_in_room(rid):
-    return [n for n in NPCS.values() if n.get('room')==rid]
+    return NPCS_BY_ROOM.get(rid, ())
 
 async def cmd_talk(p: Player, args):
     if not args:
@@ -633,17 +1069,17 @@ async def cmd_talk(p: Player, args):
     whom=args[0].lower()
     for b in npcs_in_room(p.room):
         if b['name'].lower().startswith(whom):
-            await send(p.ws, wrap(b.get('greet','They say nothing.'))+"\n")
+            await send(p.ws, b['_greet_wrapped']+"\n")
             # Tegyrios quest chain
             if p.quest and p.quest['id']=='intro_cult_talisman':
                 st=p.quest.get('stage',0)
                 if st==0:
-                    await send(p.ws, wrap(b.get('quest_start','Seek the truth near the Forgotten Acacia.'))+"\n")
-                    p.quest['stage']=1; save_player(p)
+                    await send(p.ws, b['_quest_start_wrapped']+"\n")
+                    p.quest['stage']=1; p._dirty=True
                 elif st==2:
                     if 'Cult Talisman' in p.inventory:
-                        await send(p.ws, wrap(b.get('quest_turnin','You found it! We must be vigilant.'))+"\n")
-                        p.inventory.remove('Cult Talisman'); p.xp+=50; p.quest=None; save_player(p)
+                        await send(p.ws, b['_quest_turnin_wrapped']+"\n")
+                        p.inventory.remove('Cult Talisman'); p.xp+=50; p.quest=None; p._dirty=True
                     else:
                         await send(p.ws, "You don't have the talisman yet.\n")
             # Nihorath simple hunt quest
@@ -651,29 +1087,30 @@ async def cmd_talk(p: Player, args):
                 if not p.quest:
                     p.quest = {'id':'hunt_in_the_woods','stage':0}
                     await send(p.ws, "Nihorath says: 'Hunt a Moonwolf in Nefo'Akhal and return to me.'\n")
-                    save_player(p)
+                    p._dirty = True
                 elif p.quest.get('id') == 'hunt_in_the_woods':
                     await send(p.ws, "Nihorath says: 'Your courage steadies others. The hunters thank you.'\n")
                     p.xp += 40
                     p.quest = None
-                    save_player(p)
+                    p._dirty = True
             return
     await send(p.ws, "They aren't here.\n")
 
-async def cmd_search(p: Player):
+async def cmd_search(p: Player, args):
     if p.room=='forgotten_acacia' and p.quest and p.quest['id']=='intro_cult_talisman' and p.quest.get('stage')==1:
         if 'Cult Talisman' not in p.inventory:
-            p.inventory.append('Cult Talisman'); p.quest['stage']=2; save_player(p)
+            p.inventory.append('Cult Talisman'); p.quest['stage']=2; p._dirty=True
             say_room(p.room, f"* {p.name} finds a strange talisman with two red eyes on two wings.\n")
             return
     await send(p.ws, "You search around but find nothing of note.\n")
 
 # --------------- loot / death ---------------
 def rng_chance(pct):
-    return random.randint(1,100) <= pct
+    return _rand() < pct * 0.01
 
-async def mob_death(m: Mob, killer: Player|None):
-    say_room(m.room, f"* {m.name} dies.\n")
+def mob_death(m: Mob, killer: Player|None):
+    # the death line and any loot line go to the room as one broadcast
+    lines = [MSG_DIES % m.name]
     # XP & drops
     if killer:
         killer.xp += 10
@@ -689,15 +1126,16 @@ async def mob_death(m: Mob, killer: Player|None):
         # small obols coin drop
         obols = 0
         if rng_chance(50 + luck//4):
-            obols = random.randint(1,3) + luck//10
+            obols = _randint(1,3) + luck//10
             killer.obols += obols
         if drops:
             ground = room_ground(m.room)
             ground.extend(drops)
-            say_room(m.room, f"* Loot drops on the ground: {', '.join(drops)}\n")
-        if obols:
-            await send(killer.ws, f"You loot {obols} Obol(s).\n")
-        save_player(killer)
+            lines.append(f"* Loot drops on the ground: {', '.join(drops)}\n")
+        killer._dirty = True
+    say_room(m.room, "".join(lines))
+    if killer and obols:
+        killer.queue(f"You loot {obols} Obol(s).\n")
 
 # --------------- MOB TAUNTS ---------------
 MOB_TAUNTS = {
@@ -723,12 +1161,12 @@ MOB_TAUNTS = {
 
 def mob_taunt(m: Mob, kind: str, target: Player|None=None, chance: int=30):
     try:
-        if random.randint(1,100) > max(0,min(100,chance)):
+        if _rand() >= chance * 0.01:
             return
         lines = MOB_TAUNTS.get(kind) or []
         if not lines:
             return
-        tmpl = random.choice(lines)
+        tmpl = lines[int(_rand()*len(lines))]
         text = tmpl.format(me=m.name, you=(target.name if target else "prey"))
         say_room(m.room, f"* {text}\n")
     except Exception:
@@ -736,43 +1174,42 @@ def mob_taunt(m: Mob, kind: str, target: Player|None=None, chance: int=30):
 
 # --------------- spawns ---------------
 def init_spawns():
-    rooms = WORLD.get('rooms') or {}
-    for rid, r in rooms.items():
-        sp = r.get('spawns', [])
-        if sp:
-            inst = ROOM_INSTANCES.setdefault(rid, {"mobs": [], "dead_at": {}})
-            for t in sp:
-                mob = Mob(t, rid)
-                inst['mobs'].append(mob)
-                mob_taunt(mob, "spawn", chance=25)
-
-def ai_pick_skill(m: Mob):
-    ready=[s for s in m.skills if m._skill_cd.get(s['name'].lower(),0)<=0]
+    # every room gets an instance so lookups never need a fallback
+    for rid, r in ROOMS.items():
+        inst = ROOM_INSTANCES.setdefault(rid, new_room_instance())
+        for t in r.get('spawns', []):
+            mob = Mob(t, rid)
+            inst['mobs'].append(mob)
+            mob_taunt(mob, "spawn", chance=25)
+        index_room_mobs(inst)
+
+def ai_pick_skill(m: Mob, now):
+    ready=[s for s in m.skills if m._skill_cd.get(s['name'].lower(),0)<=now]
     if not ready:
         return None
-    return random.choice(ready)
+    return ready[int(_rand()*len(ready))]
 
-async def mob_ai_attack(m: Mob, targets):
+def mob_ai_attack(m: Mob, targets, now):
     if not targets: return
-    tgt=random.choice(targets)
+    tgt=targets[int(_rand()*len(targets))]
     acted = False
     # try skill
-    skill=ai_pick_skill(m)
+    skill=ai_pick_skill(m, now)
     if skill:
         sname=skill['name']; typ=skill.get('type')
         if typ=='damage':
-            if isinstance(tgt, Player):
+            if tgt.is_player:
                 res = try_dodge_block(tgt)
                 if res == "dodge":
-                    await send(tgt.ws, f"The {m.name}'s {sname} misses you (dodged).\n")
+                    tgt.queue(f"The {m.name}'s {sname} misses you (dodged).\n")
                     acted = True
                 elif res == "block":
-                    await send(tgt.ws, f"You block the {m.name}'s {sname}.\n")
+                    tgt.queue(f"You block the {m.name}'s {sname}.\n")
                     acted = True
                 else:
                     dmg=max(0, m.power + skill.get('amount',6) - tgt.defense)
                     absorbed=tgt.apply_damage(dmg)
-                    say_room(m.room, f"* {m.name} uses {sname} on {tgt.name} for {dmg} ({absorbed} absorbed).\n")
+                    say_room(m.room, MSG_SKILL_HIT % (m.name, sname, tgt.name, dmg, absorbed))
                     acted = True
         elif typ=='dot':
             e=Effect(sname,'dot',amount=skill.get('per_tick',4),duration=skill.get('duration',6),tick=1)
@@ -785,162 +1222,211 @@ async def mob_ai_attack(m: Mob, targets):
             say_room(m.room, f"* {m.name} mends itself with {sname}.\n")
             acted = True
         if acted:
-            cd=int(skill.get('cd',6))
-            m._skill_cd[sname.lower()]=cd
+            start_cooldown(m._skill_cd, m._cd_heap, sname.lower(), int(skill.get('cd',6)), now)
             m.flag_combat()
-            if isinstance(tgt, Player): tgt.flag_combat()
-            if not tgt.alive and isinstance(tgt, Player):
-                say_room(m.room, f"* {tgt.name} falls!\n")
+            if tgt.is_player: tgt.flag_combat()
+            if not tgt.alive and tgt.is_player:
+                say_room(m.room, MSG_FALLS % tgt.name)
                 mob_taunt(m, 'kill', target=tgt, chance=70)
             else:
                 mob_taunt(m, 'attack', target=tgt, chance=40)
             return
 
     # basic attack
-    if isinstance(tgt, Player):
+    if tgt.is_player:
         res = try_dodge_block(tgt)
         if res == "block":
-            await send(tgt.ws, f"You block the {m.name}'s strike.\n")
+            tgt.queue(f"You block the {m.name}'s strike.\n")
             m.flag_combat(); tgt.flag_combat()
             return
         if res == "dodge":
-            await send(tgt.ws, f"You dodge the {m.name}'s strike.\n")
+            tgt.queue(f"You dodge the {m.name}'s strike.\n")
             m.flag_combat(); tgt.flag_combat()
             return
     dmg=max(0, m.power - tgt.defense)
     absorbed=tgt.apply_damage(dmg)
-    say_room(m.room, f"* {m.name} hits {tgt.name} for {dmg} ({absorbed} absorbed).\n")
+    say_room(m.room, MSG_HIT % (m.name, tgt.name, dmg, absorbed))
     m.flag_combat()
-    if isinstance(tgt, Player): tgt.flag_combat()
+    if tgt.is_player: tgt.flag_combat()
     mob_taunt(m, 'attack', target=tgt, chance=30)
     if not tgt.alive:
-        say_room(m.room, f"* {tgt.name} falls!\n")
+        say_room(m.room, MSG_FALLS % tgt.name)
         mob_taunt(m, 'kill', target=tgt, chance=70)
 
 # --------------- effect ticking & respawn ---------------
-async def _tick_effects_on_entity(ent: Entity, send_line_fn):
-    remove=[]
-    for eff in list(ent.effects):
-        eff.remaining -= 1
-        eff.next_tick_in -= 1
-        if eff.next_tick_in <= 0:
+def _fire_due_effects(tick):
+    """Pop every effect whose next tick or expiry is due; effects not yet due are never visited."""
+    while EFFECT_HEAP and EFFECT_HEAP[0][0] <= tick:
+        due, _, ent, eff = heapq.heappop(EFFECT_HEAP)
+        if eff not in ent.effects:
+            continue  # already removed (disconnect)
+        if not ent.is_player and not ent.alive:
+            continue  # corpse is replaced on respawn; its effects go with it
+        if due >= eff.next_tick_at:
             for line in eff.on_tick(ent):
-                await send_line_fn(line)
-        if eff.remaining <= 0:
-            remove.append(eff)
-    for e in remove:
-        # undo temporary mods (e.g., buffs)
-        if e.mod:
-            ent.remove_mods(e.mod)
-        ent.effects.remove(e)
-
-async def _maybe_respawn_player(p: Player):
+                if ent.is_player:
+                    ent.queue(line+"\n")
+                else:
+                    say_room(ent.room, f"* {line}\n")
+        if due >= eff.expires_at:
+            # undo temporary mods (e.g., buffs)
+            if eff.mod:
+                ent.remove_mods(eff.mod)
+            ent.effects.remove(eff)
+        else:
+            heapq.heappush(EFFECT_HEAP, (min(eff.next_tick_at, eff.expires_at), next(_effect_seq), ent, eff))
+
+def _maybe_respawn_player(p: Player, now):
     if p.alive:
         p._dead_since = None
         return
     if p._dead_since is None:
-        p._dead_since = time.time()
+        p._dead_since = now
         return
-    if time.time() - p._dead_since >= DEATH_RESPAWN_SECONDS:
+    if now - p._dead_since >= DEATH_RESPAWN_SECONDS:
         p.alive = True
-        p.room = 'trade_district'
+        place_player(p, 'trade_district')
         p.hp = max(1, p.max_hp // 2)
         p._dead_since = None
-        await send(p.ws, "You awaken at the Trade District.\n")
-        await show_room(p)
-        save_player(p)
+        p.queue("You awaken at the Trade District.\n")
+        show_room(p)
+        p._dirty = True
 
 # --------------- heartbeat (pacing + lifecycle safe) ---------------
 async def heartbeat():
+    global HEARTBEAT_TICKS
+    # a tick never awaits between sleeps, so each player's lines for the tick are all
+    # queued before their writer wakes and go out as a single frame
+    try:
+        # ticks land on a fixed monotonic schedule, so the work in each tick doesn't add drift
+        next_tick = time.monotonic()
+        while True:
+            next_tick += TICK_SECONDS
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # overran a whole tick: restart the schedule instead of replaying missed ticks in a burst
+                next_tick = time.monotonic() + TICK_SECONDS
+                delay = TICK_SECONDS
+            await asyncio.sleep(delay)
+            # the tick's scheduled time, not when the sleep happened to return: deadlines
+            # stamped from it stay on the tick grid instead of riding wake-up jitter
+            now = next_tick
+            # effects on players and mobs that are due this tick
+            HEARTBEAT_TICKS += 1
+            try:
+                _fire_due_effects(HEARTBEAT_TICKS)
+            except Exception as e:
+                print("[Heartbeat effect error]", e)
+            # player cooldowns & auto-attacks & combat decay & respawn
+            # ticking never adds other entities to the set being walked (wake() on an
+            # entity already listed is a no-op), so walk it in place and drop idlers after
+            idle = []
+            for p in ACTIVE_PLAYERS:
+                try:
+                    # cooldowns
+                    expire_cooldowns(p.cooldowns, p._cd_heap, now)
+                    # rest
+                    if p._rest_ticks:
+                        tick_rest(p, now)
+                    # auto-attack from 'kill'
+                    if p._next_swing_at is not None and p._next_swing_at <= now:
+                        _auto_swing(p)
+                    # death/respawn
+                    _maybe_respawn_player(p, now)
+                except Exception as e:
+                    print(f"[Heartbeat player error for {p.name}]", e)
+                if p.idle():
+                    idle.append(p)
+            ACTIVE_PLAYERS.difference_update(idle)
+
+            # dead mobs awaiting respawn
+            while RESPAWN_HEAP and RESPAWN_HEAP[0][0] <= now:
+                _, _, m, rid = heapq.heappop(RESPAWN_HEAP)
+                try:
+                    inst = ROOM_INSTANCES[rid]
+                    inst['mobs'].remove(m)
+                    newm=Mob(m.template_id,rid)
+                    inst['mobs'].append(newm)
+                    index_room_mobs(inst)
+                    say_room(rid, f"* A {newm.name} prowls in from the wilds.\n")
+                    mob_taunt(newm, 'spawn', chance=25)
+                    if newm.aggro and PLAYERS_BY_ROOM.get(rid):
+                        ACTIVE_MOBS.add(newm)
+                except Exception as e:
+                    print(f"[Heartbeat respawn error in {rid}]", e)
+
+            # mobs AI & cooldowns
+            idle.clear()
+            for m in ACTIVE_MOBS:
+                rid = m.room
+                try:
+                    if not m.alive:
+                        idle.append(m)
+                        continue
+
+                    # expire skill cooldowns
+                    expire_cooldowns(m._skill_cd, m._cd_heap, now)
+
+                    # aggro AI (attack if aggressive OR recently put in combat by being hit)
+                    if (m.aggro or m.in_combat_at(now)) and m._next_ai_at <= now:
+                        candidates=[p for p in PLAYERS_BY_ROOM.get(rid, ()) if p.alive]
+                        if candidates:
+                            mob_ai_attack(m, candidates, now)
+                        # next turn with slight jitter
+                        m._next_ai_at = now + MOB_AI_PERIOD + _next_jitter()
+
+                    # low hp taunt
+                    if m.alive and m.hp <= max(5, m.max_hp//4) and rng_chance(10):
+                        mob_taunt(m, "low_hp", chance=60)
+
+                    if m.alive and m.idle(now):
+                        idle.append(m)
+                except Exception as e:
+                    print(f"[Heartbeat AI error for {m.name} in {rid}]", e)
+            ACTIVE_MOBS.difference_update(idle)
+            flush_outboxes()
+    except asyncio.CancelledError:
+        return
+
+# --------------- saver (coalesced persistence) ---------------
+def flush_dirty_players():
+    for p in PLAYERS.values():
+        if p._dirty and p.name:
+            save_player(p)
+
+async def saver():
     try:
         while True:
-            await asyncio.sleep(TICK_SECONDS)
-            # player cooldowns & effects & combat decay & respawn
-            for p in list(PLAYERS.values()):
-                # cooldowns
-                for k in list(p.cooldowns.keys()):
-                    p.cooldowns[k]=max(0, p.cooldowns[k]-1)
-                    if p.cooldowns[k]<=0: del p.cooldowns[k]
-                # effects
-                async def _p_send(line):
-                    await send(p.ws, line+"\n")
-                await _tick_effects_on_entity(p, _p_send)
-                # death/respawn
-                await _maybe_respawn_player(p)
-
-            # mobs AI & cooldowns/effects
-            for rid, inst in ROOM_INSTANCES.items():
-                for m in list(inst.get('mobs',[])):
-                    try:
-                        # dead/respawn
-                        if not m.alive:
-                            inst.setdefault('dead_at',{})
-                            if m not in inst['dead_at']:
-                                inst['dead_at'][m]=time.time()
-                            elif time.time()-inst['dead_at'][m]>=m.respawn:
-                                inst['mobs'].remove(m)
-                                newm=Mob(m.template_id,rid)
-                                inst['mobs'].append(newm)
-                                inst['dead_at'].pop(m,None)
-                                say_room(rid, f"* A {newm.name} prowls in from the wilds.\n")
-                                mob_taunt(newm, 'spawn', chance=25)
-                            continue
-
-                        # reduce skill cooldowns
-                        for sk,cd in list(m._skill_cd.items()):
-                            m._skill_cd[sk]=max(0, cd-1)
-                            if m._skill_cd[sk]<=0: m._skill_cd.pop(sk,None)
-
-                        # ticking effects on mob
-                        async def _m_say(line):
-                            say_room(rid, f"* {line}\n")
-                        await _tick_effects_on_entity(m, _m_say)
-
-                        # AI pacing
-                        m._ai_cd = max(0, m._ai_cd - TICK_SECONDS)
-
-                        # aggro AI (attack if aggressive OR recently put in combat by being hit)
-                        if (m.aggro or m.in_combat) and m._ai_cd <= 0:
-                            candidates=[p for p in PLAYERS.values() if p.room==rid and p.alive]
-                            if candidates:
-                                await mob_ai_attack(m, candidates)
-                            # reset AI cd with slight jitter
-                            m._ai_cd = MOB_AI_PERIOD + random.uniform(-MOB_AI_JITTER, MOB_AI_JITTER)
-
-                        # low hp taunt
-                        if m.alive and m.hp <= max(5, m.max_hp//4) and rng_chance(10):
-                            mob_taunt(m, "low_hp", chance=60)
-                    except Exception as e:
-                        print(f"[Heartbeat AI error for {m.name} in {rid}]", e)
+            await asyncio.sleep(SAVE_INTERVAL)
+            flush_dirty_players()
     except asyncio.CancelledError:
         return
 
-# lifecycle hooks to manage heartbeat task
+# lifecycle hooks to manage heartbeat/saver tasks
 async def start_background_tasks(app):
+    asyncio.get_running_loop().slow_callback_duration = SLOW_CALLBACK_SECONDS
     app['heartbeat_task'] = asyncio.create_task(heartbeat())
+    app['saver_task'] = asyncio.create_task(saver())
+    app['save_writer_task'] = asyncio.create_task(_save_writer())
 
 async def cleanup_background_tasks(app):
-    task = app.get('heartbeat_task')
-    if task:
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+    for key in ('heartbeat_task', 'saver_task'):
+        await _cancel_task(app.get(key))
+    flush_dirty_players()
+    # let the writer finish everything queued, then stop
+    if SAVE_QUEUE is not None:
+        SAVE_QUEUE.put_nowait(None)
+    await app['save_writer_task']
 
 # --------------- ECONOMY / SHOP / LOOTING ---------------
 def is_shop_room(rid):
-    for sid, s in (SHOPS.get('shops') or {}).items():
-        if s.get('room')==rid:
-            return sid
-    return None
+    return ROOM_TO_SHOP.get(rid)
 
 def value_of_item(name):
     d=get_item_def(name)
-    if not d: return 0
-    return int(d.get('value', d.get('vendor_value', 0)))
+    return d.value if d else 0
 
-async def cmd_shop(p: Player):
+async def cmd_shop(p: Player, args):
     sid=is_shop_room(p.room)
     if not sid:
         await send(p.ws, "There is no shop here.\n"); return
@@ -959,10 +1445,8 @@ async def cmd_buy(p: Player, args):
         await send(p.ws, "There is no shop here.\n"); return
     s=SHOPS['shops'][sid]
     want=" ".join(args)
-    sel=None
-    for item in s.get('inventory',{}).keys():
-        if norm(item)==norm(want) or norm(item).startswith(norm(want)):
-            sel=item; break
+    nw=norm(want)
+    sel=s['_norm_index'].get(nw) or s['_prefix_index'].get(nw)
     if not sel:
         await send(p.ws,"They don't sell that.\n"); return
     price=int(s['inventory'][sel].get('price',1))
@@ -971,7 +1455,7 @@ async def cmd_buy(p: Player, args):
     p.obols -= price
     p.inventory.append(sel)
     await send(p.ws, f"You buy {sel} for {price} Obols.\n")
-    save_player(p)
+    p._dirty = True
 
 async def cmd_sell(p: Player, args):
     if not args:
@@ -980,62 +1464,50 @@ async def cmd_sell(p: Player, args):
     if not sid:
         await send(p.ws, "There is no shop here.\n"); return
     want=" ".join(args)
-    inv_match=None
-    for it in p.inventory:
-        if norm(it)==norm(want) or norm(it).startswith(norm(want)):
-            inv_match=it; break
+    inv_match=match_carried(p.inventory, want)
     if not inv_match:
         await send(p.ws, "You don't have that.\n"); return
     val=max(1, value_of_item(inv_match))
     p.inventory.remove(inv_match)
     p.obols += val
     await send(p.ws, f"You sell {inv_match} for {val} Obols. You now have {p.obols}.\n")
-    save_player(p)
+    p._dirty = True
 
 async def cmd_get(p: Player, args):
     if not args:
         await send(p.ws,"Get what?\n"); return
     want=" ".join(args)
     ground=room_ground(p.room)
-    pick=None
-    for g in ground:
-        if norm(g)==norm(want) or norm(g).startswith(norm(want)):
-            pick=g; break
+    pick=match_carried(ground, want)
     if not pick:
         await send(p.ws,"You don't see that here.\n"); return
     ground.remove(pick)
     p.inventory.append(pick)
     await send(p.ws, f"You pick up {pick}.\n")
-    save_player(p)
+    p._dirty = True
 
 async def cmd_drop(p: Player, args):
     if not args:
         await send(p.ws,"Drop what?\n"); return
     want=" ".join(args)
-    inv_match=None
-    for it in p.inventory:
-        if norm(it)==norm(want) or norm(it).startswith(norm(want)):
-            inv_match=it; break
+    inv_match=match_carried(p.inventory, want)
     if not inv_match:
         await send(p.ws, "You don't have that.\n"); return
     p.inventory.remove(inv_match)
     room_ground(p.room).append(inv_match)
     say_room(p.room, f"* {p.name} drops {inv_match}.\n")
-    save_player(p)
+    p._dirty = True
 
 # --------------- EQUIPMENT & INFO ---------------
 async def cmd_equip(p: Player, args):
     if not args:
         await send(p.ws,"Equip what?\n"); return
     want=" ".join(args)
-    inv_match=None
-    for it in p.inventory:
-        if norm(it)==norm(want) or norm(it).startswith(norm(want)):
-            inv_match=it; break
+    inv_match=match_carried(p.inventory, want)
     if not inv_match:
         await send(p.ws,"You don't have that.\n"); return
     idef=get_item_def(inv_match)
-    typ=idef.get('type')
+    typ=idef.type if idef else None
     if typ=='weapon':
         p.equipment['weapon']=inv_match
     elif typ=='armor_set':
@@ -1046,7 +1518,7 @@ async def cmd_equip(p: Player, args):
         await send(p.ws,"You can't equip that.\n"); return
     p.recompute_stats()
     await send(p.ws, f"You equip {inv_match}.\n")
-    save_player(p)
+    p._dirty = True
 
 async def cmd_unequip(p: Player, args):
     if not args:
@@ -1058,9 +1530,9 @@ async def cmd_unequip(p: Player, args):
     p.equipment[slot]=None
     p.recompute_stats()
     await send(p.ws, f"You unequip {item}.\n")
-    save_player(p)
+    p._dirty = True
 
-async def cmd_gear(p: Player):
+async def cmd_gear(p: Player, args):
     eq=p.equipment
     await send(p.ws, f"Gear — Weapon: {eq.get('weapon') or '(none)'} | Shield: {eq.get('shield') or '(none)'} | Set: {eq.get('set') or '(none)'}\n")
 
@@ -1068,10 +1540,7 @@ async def cmd_examine(p: Player, args):
     if not args:
         await send(p.ws,"Examine what?\n"); return
     want=" ".join(args)
-    target=None
-    for it in p.inventory:
-        if norm(it)==norm(want) or norm(it).startswith(norm(want)):
-            target=it; break
+    target=match_carried(p.inventory, want)
     if not target:
         target=match_item_name(want)
     if not target:
@@ -1079,164 +1548,169 @@ async def cmd_examine(p: Player, args):
     d=get_item_def(target)
     if not d:
         await send(p.ws,"Unknown item.\n"); return
-    lines=[f"{target} — {d.get('type','item')}"]
-    if d.get('desc'): lines.append(d['desc'])
-    if d.get('mods'):
-        modparts=[f"{k}+{v}" for k,v in d['mods'].items()]
-        lines.append("Stats: " + ", ".join(modparts))
-    val=value_of_item(target)
-    lines.append(f"Vendor value: {val} Obols")
+    lines=[f"{target} — {d.type}"]
+    if d.desc: lines.append(d.desc)
+    if d.stats_line: lines.append(d.stats_line)
+    lines.append(f"Vendor value: {d.value} Obols")
     await send(p.ws, "\n".join(lines)+"\n")
 
-# --------------- REST (background) ---------------
-async def do_rest(p: Player):
-    try:
-        for i in range(6):
-            await asyncio.sleep(10)
-            if p.in_combat or not p.alive:
-                await send(p.ws, "You were disturbed and stop resting.\n")
-                return
-            p.hp = clamp(p.hp + (p.max_hp//6), 0, p.max_hp)
-            await send(p.ws, f"Resting... HP {p.hp}/{p.max_hp}\n")
-        await send(p.ws, "You finish resting.\n")
-    finally:
-        p._rest_task=None
+# --------------- REST (heartbeat-driven) ---------------
+def tick_rest(p: Player, now):
+    if p.in_combat_at(now) or not p.alive:
+        p._rest_ticks = 0
+        p.queue("You were disturbed and stop resting.\n")
+        return
+    p._rest_ticks -= 1
+    if p._rest_ticks % REST_TICKS_PER_HEAL == 0:
+        p.hp = clamp(p.hp + (p.max_hp//6), 0, p.max_hp)
+        p.queue(f"Resting... HP {p.hp}/{p.max_hp}\n")
+        if not p._rest_ticks:
+            p.queue("You finish resting.\n")
 
 # --------------- command handling ---------------
+HELP_TEXT = wrap("Commands: look, go <dir>, n/s/e/w/ne/nw/se/sw/u/d, say <msg>, who, stats, abilities, use <ability> [target], target <name>, attack <mob>, kill [mob], talk [npc], quest, search, inventory|inv, get <item>, drop <item>, shop, buy <item>, sell <item>, gear, equip <item>, unequip <slot>, examine <item>, recall, rest, quit")+"\n"
+
+async def cmd_help(p: Player, args):
+    await send(p.ws, HELP_TEXT)
+
+async def cmd_look(p: Player, args):
+    show_room(p)
+
+async def cmd_go(p: Player, args):
+    if not args:
+        await send(p.ws, "Go where?\n"); return
+    direc=args[0]
+    r = room(p.room) or {}
+    dest=(r.get('exits') or {}).get(direc)
+    if not dest:
+        await send(p.ws, "You can't go that way.\n"); return
+    if p.in_combat:
+        await send(p.ws, "You can't flee while in combat!\n"); return
+    # cancel auto attack and rest if moving
+    p._next_swing_at=None; p._rest_ticks=0
+    say_room(p.room, f"* {p.name} leaves {direc}.\n", exclude=p.ws)
+    place_player(p, dest)
+    say_room(p.room, f"* {p.name} arrives.\n", exclude=p.ws)
+    p._dirty = True
+    show_room(p)
+
+async def cmd_say(p: Player, args):
+    if args:
+        say_room(p.room, f"{p.name} says: {' '.join(args)}\n")
+
+async def cmd_who(p: Player, args):
+    names=[q.name for q in PLAYERS.values() if q.name]
+    await send(p.ws, f"Players ({len(names)}): "+", ".join(names)+"\n")
+
+async def cmd_stats(p: Player, args):
+    st=p.stats
+    await send(p.ws, f"{p.name} — {p.race} {p.cls} ({p.archetype}), {p.deity}\nHP {p.hp}/{p.max_hp} | Pow {p.power} | Def {p.defense} | Obols {p.obols}\nSTR {st['STR']} | INT {st['INT']} | DEX {st['DEX']} | DEF {st['DEF']} | LCK {st['LCK']}\n")
+
+async def cmd_abilities(p: Player, args):
+    now=time.monotonic()
+    for a in ability_defs_for(p):
+        cd=cooldown_left(p.cooldowns, a.get('id',''), now)
+        await send(p.ws, f"- {a.get('name','(unknown)')} ({a.get('id','?')}) {('[CD:'+str(cd)+'s]') if cd else ''}\n")
+
+async def cmd_target(p: Player, args):
+    if args:
+        p.target=" ".join(args); await send(p.ws, f"Target set to {p.target}.\n")
+    else:
+        await send(p.ws, f"Current target: {p.target or 'none'}\n")
+
+async def cmd_quest(p: Player, args):
+    await send(p.ws, json.dumps(p.quest, indent=2)+"\n")
+
+async def cmd_inventory(p: Player, args):
+    inv = ", ".join(p.inventory) if p.inventory else "(empty)"
+    await send(p.ws, f"Inventory: {inv}\n")
+
+async def cmd_recall(p: Player, args):
+    if p.in_combat:
+        await send(p.ws, "You cannot recall during combat!\n"); return
+    # cancel auto attack and rest if recalling
+    p._next_swing_at=None; p._rest_ticks=0
+    old = p.room
+    place_player(p, 'trade_district')
+    say_room(old, f"* {p.name} vanishes in a swirl of light.\n", exclude=p.ws)
+    say_room(p.room, f"* {p.name} appears in a swirl of light.\n", exclude=p.ws)
+    p._dirty = True
+    show_room(p)
+
+async def cmd_rest(p: Player, args):
+    if p.in_combat:
+        await send(p.ws, "You cannot rest during combat!\n"); return
+    if p._rest_ticks:
+        await send(p.ws, "You are already resting.\n"); return
+    await send(p.ws, "You begin to rest...\n")
+    p._rest_ticks = REST_HEALS * REST_TICKS_PER_HEAL
+    p.wake()
+
+async def cmd_quit(p: Player, args):
+    await send(p.ws, "Goodbye.\n")
+    # cancel auto attack and rest if quitting
+    p._next_swing_at=None; p._rest_ticks=0
+    await stop_writer(p)
+    await p.ws.close()
+
+# verb -> handler(p, args); bare directions are rewritten to 'go' by normalize_cmd
+COMMAND_TABLE = {
+    'help': cmd_help, 'h': cmd_help,
+    'look': cmd_look, 'l': cmd_look,
+    'go': cmd_go,
+    'say': cmd_say,
+    'who': cmd_who,
+    'stats': cmd_stats,
+    'abilities': cmd_abilities,
+    'use': cmd_use,
+    'target': cmd_target,
+    'attack': cmd_attack,
+    'kill': cmd_kill,
+    'talk': cmd_talk,
+    'quest': cmd_quest,
+    'search': cmd_search,
+    'inventory': cmd_inventory, 'inv': cmd_inventory,
+    'get': cmd_get,
+    'drop': cmd_drop,
+    'shop': cmd_shop,
+    'buy': cmd_buy,
+    'sell': cmd_sell,
+    'gear': cmd_gear,
+    'equip': cmd_equip,
+    'unequip': cmd_unequip,
+    'examine': cmd_examine,
+    'recall': cmd_recall,
+    'rest': cmd_rest,
+    'quit': cmd_quit,
+}
+
 async def handle_command(p: Player, line: str):
     verb, args = normalize_cmd(line)
     if not verb:
         return
-
-    if verb in ('help','h'):
-        await send(p.ws, wrap("Commands: look, go <dir>, n/s/e/w/ne/nw/se/sw/u/d, say <msg>, who, stats, abilities, use <ability> [target], target <name>, attack <mob>, kill [mob], talk [npc], quest, search, inventory|inv, get <item>, drop <item>, shop, buy <item>, sell <item>, gear, equip <item>, unequip <slot>, examine <item>, recall, rest, quit")+"\n")
-    elif verb in ('look','l'):
-        await show_room(p)
-    elif verb=='go':
-        if not args:
-            await send(p.ws, "Go where?\n"); return
-        direc=args[0]
-        r = room(p.room) or {}
-        dest=(r.get('exits') or {}).get(direc)
-        if not dest:
-            await send(p.ws, "You can't go that way.\n"); return
-        if p.in_combat:
-            await send(p.ws, "You can't flee while in combat!\n"); return
-        # cancel auto attack if moving
-        if p._auto_task and not p._auto_task.done():
-            p._auto_task.cancel()
-            try:
-                await p._auto_task
-            except asyncio.CancelledError:
-                pass
-            p._auto_task=None
-        say_room(p.room, f"* {p.name} leaves {direc}.\n", exclude=p.ws)
-        p.room=dest
-        say_room(p.room, f"* {p.name} arrives.\n", exclude=p.ws)
-        save_player(p)
-        await show_room(p)
-    elif verb=='say':
-        if args:
-            say_room(p.room, f"{p.name} says: {' '.join(args)}\n")
-    elif verb=='who':
-        names=[q.name for q in PLAYERS.values() if q.name]
-        await send(p.ws, f"Players ({len(names)}): "+", ".join(names)+"\n")
-    elif verb=='stats':
-        st=p.stats
-        await send(p.ws, f"{p.name} — {p.race} {p.cls} ({p.archetype}), {p.deity}\nHP {p.hp}/{p.max_hp} | Pow {p.power} | Def {p.defense} | Obols {p.obols}\nSTR {st['STR']} | INT {st['INT']} | DEX {st['DEX']} | DEF {st['DEF']} | LCK {st['LCK']}\n")
-    elif verb=='abilities':
-        for a in ability_defs_for(p):
-            cd=p.cooldowns.get(a.get('id',''),0)
-            await send(p.ws, f"- {a.get('name','(unknown)')} ({a.get('id','?')}) {('[CD:'+str(cd)+'s]') if cd else ''}\n")
-    elif verb=='use':
-        await cmd_use(p, args)
-    elif verb=='target':
-        if args:
-            p.target=" ".join(args); await send(p.ws, f"Target set to {p.target}.\n")
-        else:
-            await send(p.ws, f"Current target: {p.target or 'none'}\n")
-    elif verb=='attack':
-        await cmd_attack(p, args)
-    elif verb=='kill':
-        await cmd_kill(p, args)
-    elif verb=='talk':
-        await cmd_talk(p, args)
-    elif verb=='quest':
-        await send(p.ws, json.dumps(p.quest, indent=2)+"\n")
-    elif verb=='search':
-        await cmd_search(p)
-    elif verb in ('inventory','inv'):
-        inv = ", ".join(p.inventory) if p.inventory else "(empty)"
-        await send(p.ws, f"Inventory: {inv}\n")
-    elif verb=='get':
-        await cmd_get(p, args)
-    elif verb=='drop':
-        await cmd_drop(p, args)
-    elif verb=='shop':
-        await cmd_shop(p)
-    elif verb=='buy':
-        await cmd_buy(p, args)
-    elif verb=='sell':
-        await cmd_sell(p, args)
-    elif verb=='gear':
-        await cmd_gear(p)
-    elif verb=='equip':
-        await cmd_equip(p, args)
-    elif verb=='unequip':
-        await cmd_unequip(p, args)
-    elif verb=='examine':
-        await cmd_examine(p, args)
-    elif verb=='recall':
-        if p.in_combat:
-            await send(p.ws, "You cannot recall during combat!\n"); return
-        # cancel auto attack if recalling
-        if p._auto_task and not p._auto_task.done():
-            p._auto_task.cancel()
-            try:
-                await p._auto_task
-            except asyncio.CancelledError:
-                pass
-            p._auto_task=None
-        old = p.room
-        p.room='trade_district'
-        say_room(old, f"* {p.name} vanishes in a swirl of light.\n", exclude=p.ws)
-        say_room(p.room, f"* {p.name} appears in a swirl of light.\n", exclude=p.ws)
-        save_player(p)
-        await show_room(p)
-    elif verb=='rest':
-        if p.in_combat:
-            await send(p.ws, "You cannot rest during combat!\n"); return
-        if p._rest_task and not p._rest_task.done():
-            await send(p.ws, "You are already resting.\n"); return
-        await send(p.ws, "You begin to rest...\n")
-        p._rest_task = asyncio.create_task(do_rest(p))
-    elif verb=='quit':
-        await send(p.ws, "Goodbye.\n")
-        # cancel auto attack if quitting
-        if p._auto_task and not p._auto_task.done():
-            p._auto_task.cancel()
-            try:
-                await p._auto_task
-            except asyncio.CancelledError:
-                pass
-            p._auto_task=None
-        await p.ws.close()
-    else:
-        await send(p.ws, "Unknown command. Try 'help'.\n")
+    handler = COMMAND_TABLE.get(verb)
+    if handler is None:
+        await send(p.ws, "Unknown command. Try 'help'.\n"); return
+    await handler(p, args)
+    flush_outboxes()
 
 # --------------- websocket + web app ---------------
 async def ws_handler(request):
-    ws = web.WebSocketResponse()
+    # no permessage-deflate: frames are short text lines and compressing each one per recipient costs more than it saves
+    ws = web.WebSocketResponse(compress=False)
     await ws.prepare(request)
 
     ip = request.remote
     p = Player(ws, ip)
     PLAYERS[ws] = p
+    start_writer(p)
 
     await send(ws, "=== NEKHIA (web alpha) ===\n")
     ok = await create_character(p)
     if not ok:
+        await stop_writer(p)
         await ws.close(); PLAYERS.pop(ws, None); return ws
+    place_player(p, p.room)
 
     try:
         async for msg in ws:
@@ -1251,6 +1725,10 @@ async def ws_handler(request):
         except Exception as e:
             print("Save on disconnect failed:", e)
         PLAYERS.pop(ws, None)
+        ACTIVE_PLAYERS.discard(p)
+        unplace_player(p)
+        p.effects.clear()  # pending EFFECT_HEAP entries are dropped when popped
+        await stop_writer(p)
         try:
             await ws.close()
         except Exception:
@@ -1274,6 +1752,19 @@ app.on_cleanup.append(cleanup_background_tasks)
 # init spawns (heartbeat starts via startup hook)
 init_spawns()
 
+def install_uvloop():
+    """Use uvloop's event loop when it is installed (POSIX only); otherwise keep asyncio's default."""
+    if sys.platform == 'win32':
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
 if __name__ == '__main__':
     PORT = int(os.getenv('PORT', '8080'))
+    if install_uvloop():
+        print("[INFO] Using uvloop event loop")
     web.run_app(app, host='0.0.0.0', port=PORT)